@@ -1,20 +1,28 @@
 # parallel_main.py
 
 import os
+import sys
 import csv
+import json
 import yaml
+import argparse
 import logging
 from mpi4py import MPI
 from scraper.core import scrape_trending, parse_trending_cards, scrape_repo_page, parse_repo_detail
 from scraper.metrics import Metrics
 from scraper.logger import setup
-from scraper.scheduler import load_checkpoint, save_checkpoint, merge_reports, save_report
+from scraper.scheduler import (
+    load_checkpoint, save_checkpoint, merge_reports, save_report, load_costs, save_costs, CostScheduler,
+    select_shard, shard_path
+)
 from scraper.urlgen import generate_trending_urls
+from scraper.delta import (
+    load_snapshot, save_snapshot, is_unchanged, stored_details, snapshot_entry, change_entry
+)
 
 _CFG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
 with open(_CFG_PATH, "r") as _f:
     _CFG = yaml.safe_load(_f)
-logging.basicConfig(level=getattr(logging, _CFG["logging"]["level"]))
 
 # filters:
 _LANGUAGES = _CFG["trending"]["languages"]
@@ -25,51 +33,140 @@ _SPOKEN_LANGUAGES = _CFG["trending"]["spoken_languages"]
 _CP_PATH = _CFG["paths"]["checkpoint"]
 _OUT_CSV = _CFG["paths"]["parallel_csv"]
 _METRICS_JSON = os.path.join(_CFG["paths"]["metrics_dir"], "parallel_metrics.json")
+_COSTS_JSON = _CFG["paths"]["url_costs"]
+_LOG_DIR = _CFG["logging"]["dir"]
+_SNAPSHOT_JSON = _CFG["paths"]["snapshot"]
+_CHANGES_JSONL = _CFG["paths"]["parallel_changes"]
 
 _MAX_RETRIES = _CFG["scraper"]["max_retries"]
 
+# Scheduling
+_PREFETCH = max(1, _CFG["scheduler"]["prefetch"])
+_COST_SMOOTHING = _CFG["scheduler"]["cost_smoothing"]
+
+# Delta mode
+_DELTA = _CFG["delta"]["enabled"]
+_DELTA_THRESHOLD = _CFG["delta"]["threshold"]
+
 _ALL_URLS = generate_trending_urls(_LANGUAGES, _PERIODS, _SPOKEN_LANGUAGES)
 
+_FIELDNAMES = [
+    'source_url', 'position', 'slug', 'owner', 'repo', 'description', 'language', 'stars', 'stars_today', 'forks',
+    'license', 'open_issues', 'contributors_count', 'top_contributors'
+]
 
-def master(comm, size):
-    logger = setup(verbose=False)
-    os.makedirs(os.path.dirname(_CP_PATH), exist_ok=True)
-    os.makedirs(os.path.dirname(_OUT_CSV), exist_ok=True)
-    os.makedirs(os.path.dirname(_METRICS_JSON), exist_ok=True)
 
-    meta, pending = load_checkpoint(_ALL_URLS, _CP_PATH)
-    total = len(_ALL_URLS)
-    logger.info(f"[master] {len(meta['completed'])} done; {len(pending)} of {total} pending")
+def master(comm, size, shard=None):
+    logger = logging.getLogger()
 
-    if len(pending) == total and os.path.exists(_OUT_CSV):
-        logger.info("[master] Fresh run detected: deleting existing CSV.")
-        os.remove(_OUT_CSV)
+    # per-shard files so independent jobs never share state
+    cp_path = shard_path(_CP_PATH, shard)
+    out_csv = shard_path(_OUT_CSV, shard)
+    metrics_json = shard_path(_METRICS_JSON, shard)
+    costs_json = shard_path(_COSTS_JSON, shard)
+    snapshot_json = shard_path(_SNAPSHOT_JSON, shard)
+    changes_jsonl = shard_path(_CHANGES_JSONL, shard)
 
-    fieldnames = [
-        'source_url', 'position', 'slug', 'owner', 'repo', 'description', 'language', 'stars', 'stars_today', 'forks',
-        'license', 'open_issues', 'contributors_count', 'top_contributors'
-    ]
+    os.makedirs(os.path.dirname(cp_path), exist_ok=True)
+    os.makedirs(os.path.dirname(out_csv), exist_ok=True)
+    os.makedirs(os.path.dirname(metrics_json), exist_ok=True)
 
-    new_csv = not os.path.exists(_OUT_CSV)
-    csv_file = open(_OUT_CSV, 'a', newline='', encoding='utf-8')
-    writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+    urls = select_shard(_ALL_URLS, shard)
+    meta, pending = load_checkpoint(urls, cp_path)
+    total = len(urls)
+    if shard is not None:
+        logger.info("[master] shard %d/%d: %d of %d URLs", shard[0], shard[1], total, len(_ALL_URLS))
+    logger.info("[master] %d done; %d of %d pending", len(meta['completed']), len(pending), total)
+
+    if len(pending) == total and os.path.exists(out_csv):
+        logger.info("[master] Fresh run detected: deleting existing CSV.")
+        os.remove(out_csv)
+    if _DELTA and len(pending) == total and os.path.exists(changes_jsonl):
+        os.remove(changes_jsonl)
+
+    new_csv = not os.path.exists(out_csv)
+    csv_file = open(out_csv, 'a', newline='', encoding='utf-8')
+    writer = csv.DictWriter(csv_file, fieldnames=_FIELDNAMES)
     if new_csv:
         writer.writeheader()
         csv_file.flush()
 
-    # dispatch initial URLs
+    # workers skip repo pages whose stars/forks stayed within the threshold
+    if _DELTA:
+        snapshot = comm.bcast(load_snapshot(snapshot_json), root=0)
+        logged = set()
+        changes_file = open(changes_jsonl, 'a', encoding='utf-8')
+
+    # longest-expected-first queue, seeded from previous runs' per-URL timings
+    scheduler = CostScheduler(pending, load_costs(costs_json), smoothing=_COST_SMOOTHING)
+    stopped = set()
+    # delta mode: repo pages fetched this run, which worker is fetching each in-flight repo,
+    # and workers waiting for repos someone else is fetching
+    fetched = {}
+    claims = {}
+    waiting = []
+
+    def dispatch(w):
+        url = scheduler.pop()
+        if url is not None:
+            comm.send(url, dest=w, tag=1)
+        elif w not in stopped:
+            # queued behind whatever the worker still has in flight
+            comm.send(None, dest=w, tag=1)
+            stopped.add(w)
+
+    def claim(w, slugs):
+        # reuse what another worker already fetched; repos it is still fetching are
+        # reported busy, the rest are claimed for `w`
+        entries = {s: fetched[s] for s in slugs if s in fetched}
+        busy = {s for s in slugs if s not in fetched and claims.get(s, w) != w}
+        for s in slugs:
+            if s not in fetched and s not in busy:
+                claims[s] = w
+        return entries, busy
+
+    def serve_waiting():
+        # answer waiters once none of their repos is being fetched by another worker
+        for w, slugs in list(waiting):
+            if all(s in fetched or claims.get(s, w) == w for s in slugs):
+                waiting.remove((w, slugs))
+                comm.send(claim(w, slugs), dest=w, tag=4)
+
+    # prefetch a few URLs per worker so nobody idles waiting on a round trip
     workers = list(range(1, size))
-    for w in workers:
-        url = pending.pop(0) if pending else None
-        comm.send(url, dest=w, tag=1)
+    for _ in range(_PREFETCH):
+        for w in workers:
+            dispatch(w)
 
     t0 = MPI.Wtime()
     all_reports = []
     closed = 0
 
     while closed < len(workers):
-        url, cards, report = comm.recv(source=MPI.ANY_SOURCE, tag=2)
+        status = MPI.Status()
+        msg = comm.recv(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status)
+        if status.Get_tag() == 3:
+            # which of these repos still need fetching? (wait: hold the reply until none is busy)
+            slugs, wait = msg
+            if wait:
+                waiting.append((status.Get_source(), slugs))
+                serve_waiting()
+            else:
+                comm.send(claim(status.Get_source(), slugs), dest=status.Get_source(), tag=4)
+            continue
+        if status.Get_tag() == 5:
+            slug, entry = msg
+            fetched[slug] = entry
+            claims.pop(slug, None)
+            serve_waiting()
+            continue
+
+        url, cards, report, elapsed = msg
         worker_rank = report['worker']
+        # the worker is done with this URL, so a failed one gives its repos up
+        for slug in [s for s, w in claims.items() if w == worker_rank]:
+            del claims[slug]
+        serve_waiting()
 
         if url is None:
             closed += 1
@@ -80,37 +177,55 @@ def master(comm, size):
         for record in cards:
             record.pop('repo_url', None)
             writer.writerow(record)
+            if _DELTA:
+                slug = record['slug']
+                prev = snapshot.get(slug)
+                # unchanged rows keep the old baseline, so slow drift still triggers a refetch;
+                # a repo trending on several URLs is logged once per run
+                if not is_unchanged(record, prev, _DELTA_THRESHOLD):
+                    if slug not in logged:
+                        changes_file.write(json.dumps(change_entry(record, prev)) + "\n")
+                        logged.add(slug)
+                    snapshot[slug] = snapshot_entry(record)
         csv_file.flush()
-        logger.info(f"[master] Added {len(cards)} rows for {url}")
+        if _DELTA:
+            changes_file.flush()
+        logger.info("[master] Added %d rows for %s", len(cards), url)
 
         # checkpoint
         meta['completed'].append(url)
-        save_checkpoint(meta, _CP_PATH)
+        save_checkpoint(meta, cp_path)
+        if _DELTA:
+            save_snapshot(snapshot, snapshot_json)
 
         all_reports.append(report)
+        scheduler.record(url, elapsed)
 
-        # send next URL
-        next_url = pending.pop(0) if pending else None
-        comm.send(next_url, dest=worker_rank, tag=1)
+        # top the worker back up
+        dispatch(worker_rank)
 
     csv_file.close()
+    save_costs(scheduler.costs, costs_json)
+    if _DELTA:
+        changes_file.close()
 
-    duplicates_removed = dedupe_and_sort_csv(_OUT_CSV, sort_by=["source_url"], dedupe_on="slug")
+    duplicates_removed = dedupe_and_sort_csv(out_csv, sort_by=["source_url"], dedupe_on="slug")
 
     # merge metrics and inject duplicates_removed
     combined = merge_reports(all_reports)
     combined["duplicates_removed"] = duplicates_removed
     combined["mpi_time_s"] = MPI.Wtime() - t0
 
-    save_report(combined, _METRICS_JSON)
-    logger.info(f"[master] Complete in {combined['mpi_time_s']:.2f}s; metrics saved.")
-    logger.info(f"Combined Metrics: {combined}")
+    save_report(combined, metrics_json)
+    logger.info("[master] Complete in %.2fs; metrics saved.", combined['mpi_time_s'])
+    logger.info("Combined Metrics: %s", combined)
 
 
 def worker(comm):
     rank = comm.Get_rank()
     metrics = Metrics()
-    logger = setup(verbose=False)
+    logger = logging.getLogger()
+    snapshot = comm.bcast(None, root=0) if _DELTA else {}
 
     while True:
         url = comm.recv(source=0, tag=1)
@@ -118,43 +233,195 @@ def worker(comm):
             break
 
         metrics.incr('urls_total')
-        logger.info(f"[rank {rank}] Fetching {url}")
+        logger.info("Fetching %s", url)
         try:
             with metrics.time_block():
                 # 1) trending list
                 html = scrape_trending(url, max_retries=_MAX_RETRIES, metrics=metrics)
                 cards = parse_trending_cards(html, source_url=url)
-                # 2) detail-page pass
-                enriched = []
+                # 2) detail-page pass; in delta mode, repos another worker is
+                # fetching right now are left until last, then waited for
+                busy = _sync_snapshot(comm, snapshot, cards) if _DELTA else set()
+                details = {}
                 for c in cards:
-                    repo_html = scrape_repo_page(c["repo_url"], metrics=metrics)
-                    details = parse_repo_detail(repo_html, c["repo_url"])
-                    enriched.append({**c, **details})
-                cards = enriched
+                    if c["slug"] not in busy:
+                        details[c["slug"]] = _repo_details(comm, c, snapshot, metrics)
+                if busy:
+                    later = [c for c in cards if c["slug"] in busy]
+                    _sync_snapshot(comm, snapshot, later, wait=True)
+                    for c in later:
+                        details[c["slug"]] = _repo_details(comm, c, snapshot, metrics)
+                cards = [{**c, **details[c["slug"]]} for c in cards]
 
             metrics.incr('urls_success')
 
         except Exception as e:
             metrics.incr('urls_failed')
-            logger.warning(f"[rank {rank}] Error fetching {url}: {e}")
+            logger.warning("Error fetching %s: %s", url, e)
             cards = []
 
         report = metrics.report()
         report['worker'] = rank
-        comm.send((url, cards, report), dest=0, tag=2)
+        comm.send((url, cards, report, metrics.timings[-1]), dest=0, tag=2)
 
     final_report = metrics.report()
     final_report['worker'] = rank
-    comm.send((None, None, final_report), dest=0, tag=2)
+    comm.send((None, None, final_report, 0.0), dest=0, tag=2)
+
+
+def _sync_snapshot(comm, snapshot, cards, wait: bool = False) -> set:
+    """
+    Ask the master about the cards that would need a repo-page fetch. Entries
+    other workers fetched this run are merged into `snapshot`; returns the
+    slugs another worker is still fetching. With `wait`, the master answers
+    only once none are, so the result is always empty.
+    """
+    stale = [c["slug"] for c in cards if not is_unchanged(c, snapshot.get(c["slug"]), _DELTA_THRESHOLD)]
+    if not stale:
+        return set()
+    comm.send((stale, wait), dest=0, tag=3)
+    entries, busy = comm.recv(source=0, tag=4)
+    snapshot.update(entries)
+    return busy
+
+
+def _repo_details(comm, card, snapshot, metrics) -> dict:
+    """Repo-page details for `card`: reused from `snapshot` if unchanged (delta mode), else fetched."""
+    prev = snapshot.get(card["slug"])
+    if _DELTA and is_unchanged(card, prev, _DELTA_THRESHOLD):
+        metrics.incr('repos_reused')
+        return stored_details(prev)
+    repo_html = scrape_repo_page(card["repo_url"], metrics=metrics)
+    details = parse_repo_detail(repo_html, card["repo_url"])
+    if _DELTA:
+        # reuse it if the repo trends on another URL, and share it with the other workers
+        entry = snapshot_entry({**card, **details})
+        snapshot[card["slug"]] = entry
+        comm.send((card["slug"], entry), dest=0, tag=5)
+    return details
+
+
+def _shard_finished(shard) -> bool:
+    """
+    True if `shard` has completed every URL it currently owns. Its CSV and
+    metrics alone don't tell: a re-run restarts the CSV but leaves the
+    previous run's metrics in place until it finishes.
+    """
+    paths = [shard_path(p, shard) for p in (_CP_PATH, _OUT_CSV, _METRICS_JSON)]
+    if not all(os.path.exists(p) for p in paths):
+        return False
+    with open(paths[0], "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return set(meta.get("completed", [])) == set(select_shard(_ALL_URLS, shard))
+
+
+def merge_shards(count, partial: bool = False) -> bool:
+    """
+    Combine the CSVs, metrics and delta change logs of shards 0..count-1 into
+    the unsharded output paths. Unless `partial` is set, every shard must be
+    finished; otherwise nothing is written and False is returned.
+    """
+    logger = logging.getLogger()
+
+    finished = []
+    for index in range(count):
+        if _shard_finished((index, count)):
+            finished.append(index)
+        else:
+            logger.warning("[merge] shard %d/%d is missing or unfinished", index, count)
+    if not finished or (len(finished) < count and not partial):
+        logger.error("[merge] %d of %d shards finished - leaving %s untouched", len(finished), count, _OUT_CSV)
+        return False
+
+    os.makedirs(os.path.dirname(_OUT_CSV), exist_ok=True)
+    os.makedirs(os.path.dirname(_METRICS_JSON), exist_ok=True)
+
+    reports = []
+    with open(_OUT_CSV, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=_FIELDNAMES)
+        writer.writeheader()
+        for index in finished:
+            with open(shard_path(_OUT_CSV, (index, count)), newline='', encoding='utf-8') as f:
+                writer.writerows(csv.DictReader(f))
+            with open(shard_path(_METRICS_JSON, (index, count)), 'r', encoding='utf-8') as f:
+                reports.append(json.load(f))
+
+    # delta-mode change logs, if the shards wrote any
+    change_logs = [shard_path(_CHANGES_JSONL, (i, count)) for i in finished]
+    change_logs = [p for p in change_logs if os.path.exists(p)]
+    if change_logs:
+        with open(_CHANGES_JSONL, 'w', encoding='utf-8') as out:
+            for path in change_logs:
+                with open(path, 'r', encoding='utf-8') as f:
+                    out.writelines(f)
+
+    # the same repo can trend on URLs that landed in different shards
+    duplicates_removed = dedupe_and_sort_csv(_OUT_CSV, sort_by=["source_url"], dedupe_on="slug")
+
+    combined = merge_reports(reports)
+    combined["duplicates_removed"] = combined.get("duplicates_removed", 0) + duplicates_removed
+    # shards run side by side, so wall time is the slowest one, not the sum
+    combined["mpi_time_s"] = max((r.get("mpi_time_s", 0.0) for r in reports), default=0.0)
+    combined["shards_merged"] = len(reports)
+
+    save_report(combined, _METRICS_JSON)
+    logger.info("[merge] Merged %d of %d shards into %s", len(reports), count, _OUT_CSV)
+    logger.info("Combined Metrics: %s", combined)
+    return True
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """argparse type for "i/N": shard index i (0-based) of N."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..N-1, got {value!r}")
+    return index, count
+
+
+def parse_shard_count(value: str) -> int:
+    """argparse type for the shard count N of --merge (N >= 1)."""
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a shard count, got {value!r}")
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"shard count must be at least 1, got {value!r}")
+    return count
 
 
 def main():
+    parser = argparse.ArgumentParser(description="MPI GitHub Trending scraper")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--shard", type=parse_shard, metavar="i/N",
+                       help="scrape only the URLs hashed into shard i of N")
+    group.add_argument("--merge", type=parse_shard_count, metavar="N",
+                       help="merge the outputs and metrics of shards 0..N-1, then exit")
+    parser.add_argument("--partial", action="store_true",
+                        help="with --merge, merge the finished shards even if some are missing or unfinished")
+    args = parser.parse_args()
+
     comm = MPI.COMM_WORLD
     rank = comm.Get_rank()
     size = comm.Get_size()
 
-    if rank == 0:
-        master(comm, size)
+    # one log file per rank (and per shard), workers echo only warnings to the shared console
+    setup(
+        level=_CFG["logging"]["level"],
+        rank=rank,
+        log_dir=shard_path(_LOG_DIR, args.shard),
+        json_lines=_CFG["logging"]["json"],
+        console_level=None if rank == 0 else "WARNING",
+        sample_every=_CFG["logging"]["sample_every"],
+    )
+
+    if args.merge is not None:
+        if rank == 0 and not merge_shards(args.merge, partial=args.partial):
+            sys.exit(1)
+    elif rank == 0:
+        master(comm, size, shard=args.shard)
     else:
         worker(comm)
 
@@ -7,6 +7,7 @@ import yaml
 import cloudscraper
 from bs4 import BeautifulSoup
 import logging
+from scraper.logger import SAMPLED
 
 _CFG_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "config.yaml")
 with open(_CFG_PATH, "r") as _f:
@@ -157,7 +158,7 @@ def parse_repo_detail(html: str, repo_url: str, metrics=None) -> dict:
         except ValueError:
             if metrics:
                 metrics.incr("parse_errors")
-            logger.warning(f"[parse] could not parse open_issues ({raw!r}) on {repo_url}")
+            logger.warning("[parse] could not parse open_issues (%r) on %s", raw, repo_url)
 
     # --- contributors count & list ---
     contributors_count = 0
@@ -170,7 +171,7 @@ def parse_repo_detail(html: str, repo_url: str, metrics=None) -> dict:
         except ValueError:
             if metrics:
                 metrics.incr("parse_errors")
-            logger.warning(f"[parse] could not parse contributors_count on {repo_url}")
+            logger.warning("[parse] could not parse contributors_count on %s", repo_url)
 
     # --- top contributors usernames ---
     top_contributors = []
@@ -186,7 +187,7 @@ def parse_repo_detail(html: str, repo_url: str, metrics=None) -> dict:
             avatar_list = contrib_cell.select_one("ul.list-style-none.d-flex.flex-wrap.mb-n2")
             if avatar_list:
                 items = avatar_list.select("li a")
-                # logger.info(f"[parse] found {len(items)} top contributors for {repo_url}")
+                # logger.info("[parse] found %d top contributors for %s", len(items), repo_url)
                 if items:
                     for a in items:
                         href = a.get("href", "")
@@ -194,9 +195,10 @@ def parse_repo_detail(html: str, repo_url: str, metrics=None) -> dict:
                             top_contributors.append(href.rstrip("/").split("/")[-1])
 
         else:
-            logger.warning(f"[parse] could not locate Contributors cell on {repo_url}")
+            logger.warning("[parse] could not locate Contributors cell on %s", repo_url)
 
-    logger.info(f"[parse] {repo_url} - Done")
+    # per-repo, so sampled to keep the log readable
+    logger.info("[parse] %s - Done", repo_url, extra=SAMPLED)
     return {
         "license":            license_name,
         "open_issues":        open_issues,
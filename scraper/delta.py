@@ -0,0 +1,66 @@
+# scraper/delta.py
+
+import json
+import os
+
+# repo-page fields that can be reused when a repo hasn't moved
+_DETAIL_FIELDS = ("license", "open_issues", "contributors_count", "top_contributors")
+
+
+def load_snapshot(path: str) -> dict:
+    """
+    Load the last stored snapshot (slug -> stars, forks and repo-page details).
+    Returns an empty dict if there is none yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_snapshot(snapshot: dict, path: str):
+    """Overwrite the snapshot JSON file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2, sort_keys=True)
+
+
+def is_unchanged(card: dict, prev: dict, threshold: float) -> bool:
+    """
+    True if `card`'s stars and forks are each within `threshold` (a fraction,
+    e.g. 0.01 for 1%) of the snapshot entry `prev`. A repo with no snapshot
+    entry always counts as changed.
+    """
+    if prev is None:
+        return False
+    for key in ("stars", "forks"):
+        old = prev.get(key, 0)
+        if abs(card[key] - old) > threshold * max(old, 1):
+            return False
+    return True
+
+
+def stored_details(prev: dict) -> dict:
+    """Repo-page details kept in a snapshot entry, in `parse_repo_detail`'s shape."""
+    return {k: prev[k] for k in _DETAIL_FIELDS}
+
+
+def snapshot_entry(record: dict) -> dict:
+    """Snapshot entry for a fully enriched row."""
+    entry = {"stars": record["stars"], "forks": record["forks"]}
+    entry.update({k: record[k] for k in _DETAIL_FIELDS})
+    return entry
+
+
+def change_entry(record: dict, prev: dict) -> dict:
+    """Compact change-log line for a row that moved past the threshold (or is new)."""
+    return {
+        "source_url":  record["source_url"],
+        "position":    record["position"],
+        "slug":        record["slug"],
+        "stars":       record["stars"],
+        "forks":       record["forks"],
+        "stars_delta": record["stars"] - prev["stars"] if prev else None,
+        "forks_delta": record["forks"] - prev["forks"] if prev else None,
+        "new":         prev is None,
+    }
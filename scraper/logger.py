@@ -1,17 +1,122 @@
 # scraper/logger.py
 
+import atexit
+import itertools
+import json
 import logging
+import logging.handlers
+import os
+import queue
 
-def setup(verbose: bool = False) -> logging.Logger:
+# pass as `extra=SAMPLED` on hot-path messages to keep only 1 in `sample_every`
+SAMPLED = {"sample": True}
+
+_listener = None
+
+
+class _RankFilter(logging.Filter):
+    """Tag every record with the process it came from ("rank 3", or "serial")."""
+    def __init__(self, rank):
+        super().__init__()
+        self.label = f"rank {rank}" if rank is not None else "serial"
+
+    def filter(self, record):
+        record.rank = self.label
+        return True
+
+
+class _SampleFilter(logging.Filter):
+    """Drop all but every `every`-th record logged with `extra=SAMPLED`."""
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._count = itertools.count()
+
+    def filter(self, record):
+        if not getattr(record, "sample", False):
+            return True
+        return next(self._count) % self.every == 0
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that only merges the message with its args before enqueueing.
+    The rest (timestamp, level, traceback layout) is formatted by the listener
+    thread, and exc_info stays on the record for the JSON formatter.
+    """
+    def prepare(self, record):
+        # snapshot now; args may be mutated before the listener gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, rank, logger, message."""
+    def format(self, record):
+        entry = {
+            "time":    self.formatTime(record),
+            "level":   record.levelname,
+            "rank":    getattr(record, "rank", None),
+            "logger":  record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def setup(verbose: bool = False, *, level: str = "INFO", rank: int = None, log_dir: str = None,
+          json_lines: bool = False, console_level: str = None, sample_every: int = 1) -> logging.Logger:
     """
-    Configure and return a logger.
+    Configure and return the root logger.
+
+    Records go through a queue to a background listener that writes them to
+    the console and, if `log_dir` is given, to a per-process file
+    (`rank-<rank>.log`, or `serial.log` when `rank` is None). Calling this
+    again after the first time just returns the root logger.
 
-    :param verbose: If True, set level to DEBUG; otherwise INFO.
+    :param verbose: If True, force level DEBUG; otherwise use `level`.
+    :param level: Level name for the root logger, e.g. "INFO".
+    :param rank: MPI rank used to tag records and name the log file.
+    :param log_dir: Directory for the per-process log file; None disables it.
+    :param json_lines: Write the log file as JSON lines instead of plain text.
+    :param console_level: Minimum level echoed to the console (defaults to `level`).
+    :param sample_every: Keep 1 in N records logged with `extra=SAMPLED`.
     :return: Configured root logger.
     """
-    level = logging.DEBUG if verbose else logging.INFO
-    logging.basicConfig(
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        level=level
-    )
-    return logging.getLogger()
+    global _listener
+    root = logging.getLogger()
+    if _listener is not None:
+        return root
+
+    level = "DEBUG" if verbose else level
+    text = logging.Formatter("%(asctime)s [%(levelname)s] [%(rank)s] %(message)s")
+
+    console = logging.StreamHandler()
+    console.setFormatter(text)
+    console.setLevel(console_level or level)
+    handlers = [console]
+
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        name = f"rank-{rank}" if rank is not None else "serial"
+        file_handler = logging.FileHandler(os.path.join(log_dir, f"{name}.log"), encoding="utf-8")
+        file_handler.setFormatter(_JsonFormatter() if json_lines else text)
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LazyQueueHandler(log_queue)
+    # filter before enqueueing so dropped samples cost next to nothing
+    queue_handler.addFilter(_SampleFilter(sample_every))
+    queue_handler.addFilter(_RankFilter(rank))
+
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return root
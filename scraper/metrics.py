@@ -7,7 +7,7 @@ from contextlib import contextmanager
 class Metrics:
     """
     Track scraping metrics such as counts of successes/failures, parse errors,
-    retries, and timings for each URL fetch+parse.
+    retries, repo pages reused in delta mode, and timings for each URL fetch+parse.
     """
     def __init__(self):
         # Initialize counters
@@ -17,6 +17,7 @@ class Metrics:
             'urls_failed':  0,
             'parse_errors': 0,
             'retries':      0,
+            'repos_reused': 0,
             'duplicates_removed': 0,
         }
         # List of per-URL durations
@@ -3,6 +3,7 @@
 import json
 import os
 import hashlib
+import heapq
 
 def merge_reports(reports):
     """
@@ -32,33 +33,56 @@ def save_report(report, path):
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(report, f, indent=2)
 
-def _compute_hash(urls):
-    """Stable hash of the sorted URL list."""
-    h = hashlib.sha256()
-    h.update("||".join(sorted(urls)).encode("utf-8"))
-    return h.hexdigest()
+def shard_of(url, count):
+    """Stable shard index of `url` among `count` shards (independent of the other URLs)."""
+    digest = hashlib.sha256(url.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+def select_shard(urls, shard):
+    """
+    Keep only the URLs that hash into `shard`, a (index, count) pair.
+    `shard=None` means unsharded and returns the URLs unchanged.
+    """
+    if shard is None:
+        return list(urls)
+    index, count = shard
+    return [u for u in urls if shard_of(u, count) == index]
+
+def shard_path(path, shard):
+    """
+    Per-shard variant of an output path, e.g. checkpoint.json ->
+    checkpoint.shard-1-of-4.json. `shard=None` returns `path` unchanged.
+    """
+    if shard is None:
+        return path
+    index, count = shard
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{index}-of-{count}{ext}"
 
 def load_checkpoint(all_urls, meta_path):
     """
     Load or initialize checkpoint metadata.
     Returns (meta, pending_urls).
-    meta has keys: url_list_hash, all_urls, completed (list).
+    meta has keys: all_urls, completed (list).
+    Completed URLs that are still in `all_urls` survive a URL-list change.
     """
-    url_hash = _compute_hash(all_urls)
     # load existing meta or start fresh
     if os.path.exists(meta_path):
         with open(meta_path, "r", encoding="utf-8") as f:
             meta = json.load(f)
     else:
-        meta = {"url_list_hash": None, "all_urls": [], "completed": []}
+        meta = {"all_urls": [], "completed": []}
 
-    # decide reset if URLs changed or fully done
-    if meta.get("url_list_hash") != url_hash or set(meta.get("completed", [])) == set(all_urls):
-        meta = {
-            "url_list_hash": url_hash,
-            "all_urls": list(all_urls),
-            "completed": []
-        }
+    # drop URLs that left the list, so newly added ones are scraped without
+    # redoing the rest; then reset once everything still listed is done
+    keep = set(all_urls)
+    completed = [u for u in meta.get("completed", []) if u in keep]
+    if set(completed) == keep:
+        completed = []
+    meta = {
+        "all_urls": list(all_urls),
+        "completed": completed
+    }
 
     done_set = set(meta["completed"])
     pending = [u for u in all_urls if u not in done_set]
@@ -69,3 +93,61 @@ def save_checkpoint(meta, meta_path):
     os.makedirs(os.path.dirname(meta_path), exist_ok=True)
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta, f, indent=2)
+
+
+def load_costs(path):
+    """
+    Load the per-URL cost model (url -> expected seconds) recorded by
+    previous runs. Returns an empty dict if none has been saved yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_costs(costs, path):
+    """Overwrite the cost-model JSON file with the given url -> seconds map."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(costs, f, indent=2, sort_keys=True)
+
+
+class CostScheduler:
+    """
+    Priority queue of pending URLs, dispatched longest-expected-first.
+
+    Expected cost comes from the per-URL timings of earlier runs; URLs with no
+    history are assumed to cost the average of the known ones. Handing out the
+    expensive pages first keeps a slow URL from starting last and stretching
+    the tail of the run.
+    """
+    def __init__(self, urls, costs=None, smoothing: float = 0.5):
+        self.costs = dict(costs or {})
+        self.smoothing = smoothing
+
+        known = [self.costs[u] for u in urls if u in self.costs]
+        default = sum(known) / len(known) if known else 0.0
+
+        # (negated cost, original index, url): max-heap on cost, ties keep URL order
+        self._heap = [(-self.costs.get(u, default), i, u) for i, u in enumerate(urls)]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def pop(self):
+        """Return the most expensive pending URL, or None once the queue is empty."""
+        if not self._heap:
+            return None
+        return heapq.heappop(self._heap)[2]
+
+    def record(self, url, seconds: float):
+        """
+        Fold an observed duration for `url` into the cost model
+        (exponential moving average weighted by `smoothing`).
+        """
+        prev = self.costs.get(url)
+        if prev is None:
+            self.costs[url] = seconds
+        else:
+            self.costs[url] = self.smoothing * seconds + (1 - self.smoothing) * prev
@@ -2,18 +2,20 @@
 
 import os
 import csv
+import json
 import yaml
-import logging
 from scraper.core import scrape_trending, parse_trending_cards, scrape_repo_page, parse_repo_detail
 from scraper.metrics import Metrics
 from scraper.logger import setup
 from scraper.scheduler import load_checkpoint, save_checkpoint, save_report
 from scraper.urlgen import generate_trending_urls
+from scraper.delta import (
+    load_snapshot, save_snapshot, is_unchanged, stored_details, snapshot_entry, change_entry
+)
 
 _CFG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
 with open(_CFG_PATH, "r") as _f:
     _CFG = yaml.safe_load(_f)
-logging.basicConfig(level=getattr(logging, _CFG["logging"]["level"]))
 
 # filters:
 _LANGUAGES = _CFG["trending"]["languages"]
@@ -24,14 +26,26 @@ _SPOKEN_LANGUAGES = _CFG["trending"]["spoken_languages"]
 _CP_PATH = _CFG["paths"]["checkpoint"]
 _OUT_CSV = _CFG["paths"]["serial_csv"]
 _METRICS_JSON = os.path.join(_CFG["paths"]["metrics_dir"], "serial_metrics.json")
+_SNAPSHOT_JSON = _CFG["paths"]["snapshot"]
+_LOG_DIR = _CFG["logging"]["dir"]
+_CHANGES_JSONL = _CFG["paths"]["serial_changes"]
 
 _MAX_RETRIES = _CFG["scraper"]["max_retries"]
 
+# Delta mode
+_DELTA = _CFG["delta"]["enabled"]
+_DELTA_THRESHOLD = _CFG["delta"]["threshold"]
+
 _ALL_URLS = generate_trending_urls(_LANGUAGES, _PERIODS, _SPOKEN_LANGUAGES)
 
 
 def main():
-    logger = setup(verbose=False)
+    logger = setup(
+        level=_CFG["logging"]["level"],
+        log_dir=_LOG_DIR,
+        json_lines=_CFG["logging"]["json"],
+        sample_every=_CFG["logging"]["sample_every"],
+    )
     metrics = Metrics()
 
     os.makedirs(os.path.dirname(_CP_PATH), exist_ok=True)
@@ -40,7 +54,7 @@ def main():
 
     meta, pending = load_checkpoint(_ALL_URLS, _CP_PATH)
     total = len(_ALL_URLS)
-    logger.info(f"{len(meta['completed'])} done; {len(pending)} of {total} pending")
+    logger.info("%d done; %d of %d pending", len(meta['completed']), len(pending), total)
 
     if not pending:
         logger.info("No pending URLs - exiting.")
@@ -49,6 +63,8 @@ def main():
     if len(pending) == total and os.path.exists(_OUT_CSV):
         logger.info("Fresh run detected: deleting existing CSV.")
         os.remove(_OUT_CSV)
+    if _DELTA and len(pending) == total and os.path.exists(_CHANGES_JSONL):
+        os.remove(_CHANGES_JSONL)
 
     fieldnames = [
         'source_url', 'position', 'slug', 'owner', 'repo', 'description', 'language', 'stars', 'stars_today', 'forks',
@@ -62,9 +78,16 @@ def main():
         writer.writeheader()
         csv_file.flush()
 
+    # skip repo pages whose stars/forks stayed within the threshold
+    # (repos refreshed earlier in this run are reused too)
+    snapshot = load_snapshot(_SNAPSHOT_JSON) if _DELTA else {}
+    logged = set()
+    if _DELTA:
+        changes_file = open(_CHANGES_JSONL, 'a', encoding='utf-8')
+
     for url in pending:
         metrics.incr('urls_total')
-        logger.info(f"Fetching {url}")
+        logger.info("Fetching %s", url)
         try:
             with metrics.time_block():
                 # 1) get trending list
@@ -74,8 +97,13 @@ def main():
                 # 2) for each card, fan out to the repo page
                 enriched = []
                 for c in cards:
-                    repo_html = scrape_repo_page(c["repo_url"], metrics=metrics)
-                    details = parse_repo_detail(repo_html, c["repo_url"])
+                    prev = snapshot.get(c["slug"])
+                    if _DELTA and is_unchanged(c, prev, _DELTA_THRESHOLD):
+                        metrics.incr('repos_reused')
+                        details = stored_details(prev)
+                    else:
+                        repo_html = scrape_repo_page(c["repo_url"], metrics=metrics)
+                        details = parse_repo_detail(repo_html, c["repo_url"])
                     enriched.append({**c, **details})
                 cards = enriched
 
@@ -85,17 +113,33 @@ def main():
             for record in cards:
                 record.pop('repo_url', None)
                 writer.writerow(record)
+                if _DELTA:
+                    slug = record['slug']
+                    prev = snapshot.get(slug)
+                    # unchanged rows keep the old baseline, so slow drift still triggers a refetch;
+                    # a repo trending on several URLs is logged once per run
+                    if not is_unchanged(record, prev, _DELTA_THRESHOLD):
+                        if slug not in logged:
+                            changes_file.write(json.dumps(change_entry(record, prev)) + "\n")
+                            logged.add(slug)
+                        snapshot[slug] = snapshot_entry(record)
             csv_file.flush()
+            if _DELTA:
+                changes_file.flush()
 
             # update checkpoint
             meta['completed'].append(url)
             save_checkpoint(meta, _CP_PATH)
+            if _DELTA:
+                save_snapshot(snapshot, _SNAPSHOT_JSON)
 
         except Exception as e:
             metrics.incr('urls_failed')
-            logger.warning(f"Error fetching {url} after retries: {e}")
+            logger.warning("Error fetching %s after retries: %s", url, e)
 
     csv_file.close()
+    if _DELTA:
+        changes_file.close()
 
     duplicates_removed = dedupe_and_sort_csv(_OUT_CSV, sort_by=["source_url"], dedupe_on="slug")
 
@@ -104,7 +148,7 @@ def main():
 
     save_report(metrics.report(), _METRICS_JSON)
     logger.info("Serial run metrics saved.")
-    logger.info(f"Metrics: {report}")
+    logger.info("Metrics: %s", report)
 
 
 def dedupe_and_sort_csv(path: str, *, sort_by: list[str], dedupe_on: str = "slug") -> int: